@@ -1,20 +1,95 @@
 """AI interaction endpoints."""
 
-from typing import List, Dict, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+import functools
+from typing import List, Dict, Any, Awaitable, Callable, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing_extensions import TypedDict
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import get_settings
 from app.core.database import get_db
 from app.api.routes.auth import get_current_user
+from app.services import semantic_cache
 from app.services.ai_service import ai_service
 from app.models import User
 
 router = APIRouter()
+settings = get_settings()
+
+# Analysis prompts share one fixed system preamble so the provider can
+# cache the prefix; only the user's text varies between requests.
+ANALYSIS_SYSTEM_PROMPT = "You are a professional writing assistant."
+ANALYSIS_PROMPTS = {
+    "grammar": "Please analyze the following text for grammatical errors and suggest improvements:",
+    "style": "Please analyze the writing style of the following text and provide suggestions for improvement:",
+    "clarity": "Please analyze the clarity of the following text and suggest ways to make it clearer:",
+    "tone": "Please analyze the tone of the following text and describe it:"
+}
 
+STREAM_DONE_FRAME = b'data: {"done":true}\n\n'
 
-class ChatMessage(BaseModel):
-    """Chat message model."""
+
+def wrap_ai_errors(action: str) -> Callable:
+    """Map errors escaping an AI endpoint to HTTP errors.
+    
+    ``ValueError`` becomes 400 and ``KeyError`` 404; anything else is a 500
+    whose detail starts with ``action``. ``HTTPException`` passes through.
+    """
+    def decorator(endpoint: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(endpoint)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return await endpoint(*args, **kwargs)
+            except HTTPException:
+                raise
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+            except KeyError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Not found: {str(e)}"
+                )
+            except Exception as e:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"{action}: {str(e)}"
+                )
+        return wrapper
+    return decorator
+
+
+async def _read_text_body(request: Request, max_bytes: int) -> str:
+    """Read a UTF-8 request body, rejecting it as soon as it exceeds max_bytes."""
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Text exceeds maximum size of {max_bytes} bytes"
+    )
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+        raise too_large
+    
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise too_large
+    # Invalid UTF-8 raises UnicodeDecodeError, a ValueError, so it maps to 400
+    return body.decode("utf-8")
+
+
+class ChatMessage(TypedDict):
+    """Chat message model.
+    
+    A TypedDict rather than a model: requests validate straight into the
+    plain dicts the AI service and provider SDKs take, with no conversion.
+    """
     role: str  # "system", "user", "assistant"
     content: str
 
@@ -27,6 +102,7 @@ class ChatRequest(BaseModel):
     temperature: float = 0.7
     max_tokens: int = 4000
     stream: bool = False
+    cache_prefix: bool = True  # Mark stable leading messages for provider prompt caching
 
 
 class ChatResponse(BaseModel):
@@ -50,276 +126,236 @@ class ModelsResponse(BaseModel):
 
 
 @router.get("/providers", response_model=ProvidersResponse)
+@wrap_ai_errors("Failed to get providers")
 async def get_providers(
     current_user: User = Depends(get_current_user)
 ):
     """Get available AI providers."""
-    try:
-        providers = ai_service.get_available_providers()
-        from app.core.config import get_settings
-        settings = get_settings()
-        
-        return ProvidersResponse(
-            providers=providers,
-            default_provider=settings.default_ai_provider
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get providers: {str(e)}"
-        )
+    return ProvidersResponse(
+        providers=ai_service.get_available_providers(),
+        default_provider=settings.default_ai_provider
+    )
 
 
 @router.get("/test/providers", response_model=ProvidersResponse)
+@wrap_ai_errors("Failed to get providers")
 async def get_providers_public():
     """Get available AI providers (public endpoint for testing)."""
-    try:
-        providers = ai_service.get_available_providers()
-        from app.core.config import get_settings
-        settings = get_settings()
-        
-        return ProvidersResponse(
-            providers=providers,
-            default_provider=settings.default_ai_provider
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get providers: {str(e)}"
-        )
+    return ProvidersResponse(
+        providers=ai_service.get_available_providers(),
+        default_provider=settings.default_ai_provider
+    )
 
 
 @router.get("/providers/{provider}/models", response_model=ModelsResponse)
+@wrap_ai_errors("Failed to get models")
 async def get_models(
     provider: str,
     current_user: User = Depends(get_current_user)
 ):
     """Get available models for a provider."""
-    try:
-        models = ai_service.get_available_models(provider)
-        if not models:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Provider '{provider}' not found or no models available"
-            )
-        
-        return ModelsResponse(
-            models=models,
-            provider=provider
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
+    models = ai_service.get_available_models(provider)
+    if not models:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get models: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Provider '{provider}' not found or no models available"
         )
+    
+    return ModelsResponse(
+        models=models,
+        provider=provider
+    )
 
 
 @router.post("/chat", response_model=ChatResponse)
+@wrap_ai_errors("AI service error")
 async def chat_completion(
     request: ChatRequest,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Generate chat completion."""
-    try:
-        # Convert Pydantic models to dict for AI service
-        messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
-        
-        # Try to use the main AI service first, fallback to mock service
-        try:
-            # Use user's preferred provider if not specified
-            provider = request.provider or "google"  # Default to Google/Gemini
-            model = request.model or "gemini-1.5-flash"  # Default Gemini model
-            
-            if request.stream:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Streaming not supported in this endpoint. Use /ai/chat/stream"
-                )
-
-            response_content = await ai_service.chat_completion(
-                messages=messages,
-                provider=provider,
-                model=model,
-                temperature=request.temperature,
-                max_tokens=request.max_tokens
-            )
-            
-            return ChatResponse(
-                content=response_content,
-                provider=provider,
-                model=model
-            )
-        except Exception as ai_error:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"AI service error: {str(ai_error)}"
-            )
-        
-    except ValueError as e:
+    if request.stream:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
+            detail="Streaming not supported in this endpoint. Use /ai/chat/stream"
         )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"AI service error: {str(e)}"
+    
+    messages = request.messages
+    
+    # Use user's preferred provider if not specified
+    provider = request.provider or "google"  # Default to Google/Gemini
+    model = request.model or "gemini-1.5-flash"  # Default Gemini model
+    
+    cache_meta = {
+        "namespace": current_user.id,
+        "provider": provider,
+        "model": model,
+        "temperature": request.temperature,
+        "max_tokens": request.max_tokens,
+    }
+    cached_content = await semantic_cache.get(messages, cache_meta)
+    if cached_content is not None:
+        response.headers["X-Cache"] = "hit"
+        return ChatResponse(
+            content=cached_content,
+            provider=provider,
+            model=model
         )
+    
+    response_content = await ai_service.chat_completion(
+        messages=messages,
+        provider=provider,
+        model=model,
+        temperature=request.temperature,
+        max_tokens=request.max_tokens,
+        cache_prefix=request.cache_prefix
+    )
+    await semantic_cache.put(messages, cache_meta, response_content)
+    response.headers["X-Cache"] = "miss"
+    
+    return ChatResponse(
+        content=response_content,
+        provider=provider,
+        model=model
+    )
 
 
 @router.post("/test/chat", response_model=ChatResponse)
+@wrap_ai_errors("AI service error")
 async def chat_completion_public(request: ChatRequest):
     """Generate chat completion (public endpoint for testing)."""
-    try:
-        # Convert Pydantic models to dict for AI service
-        messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
-        
-        # Try to use the main AI service first, fallback to mock service
-        try:
-            # Use default provider
-            provider = request.provider or "google"  # Try Google/Gemini first
-            model = request.model or "gemini-1.5-flash"  # Default Gemini model
-            
-            response_content = await ai_service.chat_completion(
-                messages=messages,
-                provider=provider,
-                model=model,
-                temperature=request.temperature,
-                max_tokens=request.max_tokens
-            )
-            
-            return ChatResponse(
-                content=response_content,
-                provider=provider,
-                model=model
-            )
-        except Exception as ai_error:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"AI service error: {str(ai_error)}"
-            )
-        
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"AI service error: {str(e)}"
-        )
+    messages = request.messages
+    
+    # Use default provider
+    provider = request.provider or "google"  # Try Google/Gemini first
+    model = request.model or "gemini-1.5-flash"  # Default Gemini model
+    
+    response_content = await ai_service.chat_completion(
+        messages=messages,
+        provider=provider,
+        model=model,
+        temperature=request.temperature,
+        max_tokens=request.max_tokens,
+        cache_prefix=request.cache_prefix
+    )
+    
+    return ChatResponse(
+        content=response_content,
+        provider=provider,
+        model=model
+    )
 
 
 @router.post("/chat/stream")
+@wrap_ai_errors("AI service error")
 async def chat_completion_stream(
     request: ChatRequest,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Generate streaming chat completion."""
-    from fastapi.responses import StreamingResponse
-    import json
+    messages = request.messages
     
-    try:
-        # Convert Pydantic models to dict for AI service
-        messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
-        
-        # Use user's preferred provider if not specified
-        provider = request.provider or current_user.preferred_ai_provider.value
-        model = request.model or current_user.preferred_model
-        
-        async def generate():
-            try:
-                async for chunk in ai_service.stream_completion(
-                    messages=messages,
-                    provider=provider,
-                    model=model,
-                    temperature=request.temperature,
-                    max_tokens=request.max_tokens
-                ):
-                    yield f"data: {json.dumps({'content': chunk, 'provider': provider, 'model': model})}\n\n"
-                
-                # Send completion signal
-                yield f"data: {json.dumps({'done': True})}\n\n"
-                
-            except Exception as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-        
-        return StreamingResponse(
-            generate(),
-            media_type="text/plain",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Content-Type": "text/event-stream",
-            }
-        )
-        
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"AI service error: {str(e)}"
-        )
+    # Use user's preferred provider if not specified
+    provider = request.provider or current_user.preferred_ai_provider.value
+    model = request.model or current_user.preferred_model
+    
+    # Provider and model are fixed for the stream, so encode them once
+    frame_suffix = b"," + orjson.dumps({"provider": provider, "model": model})[1:] + b"\n\n"
+    
+    async def generate():
+        try:
+            async for chunk in ai_service.stream_completion(
+                messages=messages,
+                provider=provider,
+                model=model,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens,
+                cache_prefix=request.cache_prefix
+            ):
+                yield b'data: {"content":' + orjson.dumps(chunk) + frame_suffix
+            
+            # Send completion signal
+            yield STREAM_DONE_FRAME
+            
+        except Exception as e:
+            yield b"data: " + orjson.dumps({"error": str(e)}) + b"\n\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+    )
 
 
-@router.post("/analyze-text")
+@router.post(
+    "/analyze-text",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"text/plain": {"schema": {"type": "string"}}},
+        }
+    },
+)
+@wrap_ai_errors("Analysis failed")
 async def analyze_text(
-    text: str,
+    request: Request,
+    response: Response,
     analysis_type: str = "grammar",  # grammar, style, clarity, tone
     current_user: User = Depends(get_current_user)
 ):
-    """Analyze text with AI."""
-    try:
-        # Create analysis prompt based on type
-        analysis_prompts = {
-            "grammar": "Please analyze the following text for grammatical errors and suggest improvements:",
-            "style": "Please analyze the writing style of the following text and provide suggestions for improvement:",
-            "clarity": "Please analyze the clarity of the following text and suggest ways to make it clearer:",
-            "tone": "Please analyze the tone of the following text and describe it:"
-        }
-        
-        if analysis_type not in analysis_prompts:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid analysis type. Must be one of: {list(analysis_prompts.keys())}"
-            )
-        
-        prompt = analysis_prompts[analysis_type]
-        messages = [
-            {"role": "system", "content": "You are a professional writing assistant."},
-            {"role": "user", "content": f"{prompt}\n\n{text}"}
-        ]
-        
-        provider = current_user.preferred_ai_provider.value
-        model = current_user.preferred_model
-        
-        response = await ai_service.chat_completion(
+    """Analyze text with AI.
+    
+    The text is sent as the raw request body, so it is never parsed or
+    validated as JSON and oversized bodies are rejected while streaming in.
+    """
+    if analysis_type not in ANALYSIS_PROMPTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid analysis type. Must be one of: {list(ANALYSIS_PROMPTS.keys())}"
+        )
+    
+    text = await _read_text_body(request, settings.max_analyze_bytes)
+    
+    # Stable prefix first, variable text last
+    prompt = ANALYSIS_PROMPTS[analysis_type]
+    messages = [
+        {"role": "system", "content": f"{ANALYSIS_SYSTEM_PROMPT}\n\n{prompt}"},
+        {"role": "user", "content": text}
+    ]
+    
+    provider = current_user.preferred_ai_provider.value
+    model = current_user.preferred_model
+    
+    # Grammar and tone depend on exact casing, so only exact matches count
+    cache_meta = {
+        "namespace": current_user.id,
+        "analysis_type": analysis_type,
+        "provider": provider,
+        "model": model,
+    }
+    analysis = await semantic_cache.get(messages, cache_meta, semantic=False)
+    if analysis is not None:
+        response.headers["X-Cache"] = "hit"
+    else:
+        analysis = await ai_service.chat_completion(
             messages=messages,
             provider=provider,
-            model=model
-        )
-        
-        return {
-            "analysis_type": analysis_type,
-            "original_text": text,
-            "analysis": response,
-            "provider": provider,
-            "model": model
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Analysis failed: {str(e)}"
+            model=model,
+            cache_prefix=True
         )
+        await semantic_cache.put(messages, cache_meta, analysis, semantic=False)
+        response.headers["X-Cache"] = "miss"
+    
+    return {
+        "analysis_type": analysis_type,
+        "original_text": text,
+        "analysis": analysis,
+        "provider": provider,
+        "model": model
+    }
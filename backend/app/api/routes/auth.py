@@ -1,13 +1,14 @@
 """Authentication endpoints."""
 
 from datetime import timedelta
-from typing import Any
+from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 
+from app.core import auth_cache
 from app.core.database import get_db
 from app.core.security import (
     authenticate_user,
@@ -16,14 +17,17 @@ from app.core.security import (
     create_user,
     get_user_by_email,
     get_user_by_id,
-    verify_token,
 )
 from app.core.config import get_settings
+from app.services import login_throttle
 
 router = APIRouter()
 settings = get_settings()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.api_prefix}/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl=f"{settings.api_prefix}/auth/login", auto_error=False
+)
 
 
 class UserCreate(BaseModel):
@@ -43,8 +47,7 @@ class UserResponse(BaseModel):
     is_active: bool
     is_verified: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class TokenResponse(BaseModel):
@@ -66,11 +69,11 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    user_id = verify_token(token)
+    user_id = auth_cache.get_token_subject(token)
     if user_id is None:
         raise credentials_exception
     
-    user = await get_user_by_id(db, int(user_id))
+    user = await auth_cache.get_user(db, int(user_id), token)
     if user is None:
         raise credentials_exception
     
@@ -111,18 +114,30 @@ async def register(
 
 @router.post("/login", response_model=TokenResponse)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
 ):
     """Login user and return tokens."""
+    client_ip = request.client.host if request.client else None
+    if not await login_throttle.allow(form_data.username, client_ip):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(settings.login_attempt_window)},
+        )
+    
     user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
+        await login_throttle.record_failure(form_data.username, client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    await login_throttle.clear(form_data.username, client_ip)
+    
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -149,8 +164,8 @@ async def refresh_token(
     db: AsyncSession = Depends(get_db)
 ):
     """Refresh access token."""
-    user_id = verify_token(refresh_token)
-    if user_id is None:
+    user_id = auth_cache.get_token_subject(refresh_token)
+    if user_id is None or await auth_cache.is_revoked(refresh_token):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token"
@@ -186,6 +201,8 @@ async def get_current_user_info(
 
 
 @router.post("/logout")
-async def logout():
+async def logout(token: Optional[str] = Depends(optional_oauth2_scheme)):
     """Logout user (client should remove tokens)."""
+    if token:
+        await auth_cache.revoke_token(token)
     return {"message": "Successfully logged out"}
@@ -1,17 +1,36 @@
 """Document management endpoints."""
 
-from typing import List, Optional
+import codecs
+import hashlib
+import os
+import uuid
+from datetime import datetime
+from typing import AsyncGenerator, AsyncIterator, List, Optional
+
+import aiofiles
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, insert, update, delete, and_, or_, bindparam, func, RowMapping
 
+from app.core.config import get_settings
 from app.core.database import get_db
 from app.api.routes.auth import get_current_user
 from app.models import User, Document, DocumentStatus
-import json
+from app.services import stats_cache, text_stats
 
 router = APIRouter()
+settings = get_settings()
+
+# Page sizes above this are streamed instead of built in memory
+EAGER_PAGE_LIMIT = 100
+
+UPLOAD_CHUNK_SIZE = 256 * 1024
+TEXT_FILE_TYPES = ("text/plain", "text/markdown")
+ALLOWED_FILE_TYPES = frozenset(settings.allowed_file_types)
 
 
 class DocumentCreate(BaseModel):
@@ -40,13 +59,69 @@ class DocumentResponse(BaseModel):
     tags: List[str] = []
     status: DocumentStatus
     word_count: int
-    created_at: str
-    updated_at: str
-    published_at: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    published_at: Optional[datetime] = None
     published_url: Optional[str] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Read paths select just the response columns, skipping ORM instances and
+# response model validation
+DOCUMENT_COLUMNS = tuple(getattr(Document, name) for name in DocumentResponse.model_fields)
+
+# Single-document statements are built once; requests only bind values
+OWNED_DOCUMENT = and_(
+    Document.id == bindparam("document_id"),
+    Document.owner_id == bindparam("user_id"),
+)
+GET_DOCUMENT = select(*DOCUMENT_COLUMNS).where(OWNED_DOCUMENT)
+DELETE_DOCUMENT = (
+    delete(Document)
+    .where(OWNED_DOCUMENT)
+    .returning(Document.status, Document.word_count)
+)
+PUBLISH_DOCUMENT = (
+    update(Document)
+    .where(OWNED_DOCUMENT)
+    .values(
+        status=DocumentStatus.PUBLISHED,
+        published_at=func.now(),
+        published_url=bindparam("publish_url"),
+    )
+    .returning(Document)
+)
+
+
+async def stream_json_array(
+    rows: AsyncIterator[RowMapping],
+) -> AsyncGenerator[bytes, None]:
+    """Encode rows as a JSON array one row at a time."""
+    separator = b"["
+    async for row in rows:
+        yield separator + orjson.dumps(dict(row))
+        separator = b","
+    yield b"]" if separator == b"," else b"[]"
+
+
+async def file_iter(
+    file: UploadFile, size: int = UPLOAD_CHUNK_SIZE
+) -> AsyncGenerator[bytes, None]:
+    """Read an uploaded file in fixed-size chunks."""
+    while chunk := await file.read(size):
+        yield chunk
+
+
+def decode_text(decoder: codecs.IncrementalDecoder, chunk: bytes, final: bool = False) -> str:
+    """Decode the next chunk of an uploaded text file."""
+    try:
+        return decoder.decode(chunk, final)
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File is not valid UTF-8"
+        )
 
 
 @router.post("/", response_model=DocumentResponse)
@@ -58,28 +133,33 @@ async def create_document(
     """Create a new document."""
     try:
         # Calculate word count
-        word_count = len(document_data.content.split()) if document_data.content else 0
+        word_count = text_stats.word_count(document_data.content)
         
-        document = Document(
-            title=document_data.title,
-            content=document_data.content,
-            description=document_data.description,
-            tags=document_data.tags,
-            word_count=word_count,
-            owner_id=current_user.id
+        result = await db.execute(
+            insert(Document)
+            .values(
+                title=document_data.title,
+                content=document_data.content,
+                description=document_data.description,
+                tags=document_data.tags,
+                word_count=word_count,
+                owner_id=current_user.id
+            )
+            .returning(Document)
         )
-        
-        db.add(document)
+        document = result.scalar_one()
         await db.commit()
-        await db.refresh(document)
+        await stats_cache.increment(
+            current_user.id, total_documents=1, total_words=word_count
+        )
         
         return document
         
-    except Exception as e:
+    except SQLAlchemyError:
         await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create document: {str(e)}"
+            detail="Failed to create document"
         )
 
 
@@ -87,14 +167,21 @@ async def create_document(
 async def get_documents(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     status_filter: Optional[DocumentStatus] = None,
     search: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get user's documents with optional filtering."""
+    """Get user's documents with optional filtering.
+    
+    Pass the ``updated_at`` and ``id`` of the last document received as
+    ``cursor`` and ``cursor_id`` to fetch the next page without an OFFSET
+    scan.
+    """
     try:
-        query = select(Document).where(Document.owner_id == current_user.id)
+        query = select(*DOCUMENT_COLUMNS).where(Document.owner_id == current_user.id)
         
         # Apply filters
         if status_filter:
@@ -108,17 +195,37 @@ async def get_documents(
             )
         
         # Apply pagination
-        query = query.offset(skip).limit(limit).order_by(Document.updated_at.desc())
+        if cursor:
+            # Documents sharing the cursor's timestamp are ordered by id
+            if cursor_id is None:
+                query = query.where(Document.updated_at < cursor)
+            else:
+                query = query.where(
+                    or_(
+                        Document.updated_at < cursor,
+                        and_(Document.updated_at == cursor, Document.id < cursor_id),
+                    )
+                )
+        query = (
+            query.order_by(Document.updated_at.desc(), Document.id.desc())
+            .offset(skip)
+            .limit(limit)
+        )
         
-        result = await db.execute(query)
-        documents = result.scalars().all()
+        if limit <= EAGER_PAGE_LIMIT:
+            result = await db.execute(query)
+            return ORJSONResponse([dict(row) for row in result.mappings()])
         
-        return documents
+        # Large pages are encoded row by row as the database returns them
+        result = await db.stream(query)
+        return StreamingResponse(
+            stream_json_array(result.mappings()), media_type="application/json"
+        )
         
-    except Exception as e:
+    except SQLAlchemyError:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get documents: {str(e)}"
+            detail="Failed to get documents"
         )
 
 
@@ -131,11 +238,9 @@ async def get_document(
     """Get a specific document."""
     try:
         result = await db.execute(
-            select(Document).where(
-                and_(Document.id == document_id, Document.owner_id == current_user.id)
-            )
+            GET_DOCUMENT, {"document_id": document_id, "user_id": current_user.id}
         )
-        document = result.scalar_one_or_none()
+        document = result.mappings().one_or_none()
         
         if not document:
             raise HTTPException(
@@ -143,14 +248,12 @@ async def get_document(
                 detail="Document not found"
             )
         
-        return document
+        return ORJSONResponse(dict(document))
         
-    except HTTPException:
-        raise
-    except Exception as e:
+    except SQLAlchemyError:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get document: {str(e)}"
+            detail="Failed to get document"
         )
 
 
@@ -163,11 +266,20 @@ async def update_document(
 ):
     """Update a document."""
     try:
-        result = await db.execute(
-            select(Document).where(
-                and_(Document.id == document_id, Document.owner_id == current_user.id)
+        params = {"document_id": document_id, "user_id": current_user.id}
+        update_data = document_data.model_dump(exclude_unset=True)
+        
+        # Recalculate word count if content changed
+        if document_data.content is not None:
+            update_data["word_count"] = text_stats.word_count(document_data.content)
+        
+        if update_data:
+            result = await db.execute(
+                update(Document).where(OWNED_DOCUMENT).values(**update_data).returning(Document),
+                params
             )
-        )
+        else:
+            result = await db.execute(select(Document).where(OWNED_DOCUMENT), params)
         document = result.scalar_one_or_none()
         
         if not document:
@@ -176,27 +288,18 @@ async def update_document(
                 detail="Document not found"
             )
         
-        # Update fields
-        update_data = document_data.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(document, field, value)
-        
-        # Recalculate word count if content changed
-        if document_data.content is not None:
-            document.word_count = len(document_data.content.split()) if document_data.content else 0
-        
         await db.commit()
-        await db.refresh(document)
+        # Title, description and tag edits leave the counters as they are
+        if "word_count" in update_data or "status" in update_data:
+            await stats_cache.invalidate(current_user.id)
         
         return document
         
-    except HTTPException:
-        raise
-    except Exception as e:
+    except SQLAlchemyError:
         await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update document: {str(e)}"
+            detail="Failed to update document"
         )
 
 
@@ -209,30 +312,31 @@ async def delete_document(
     """Delete a document."""
     try:
         result = await db.execute(
-            select(Document).where(
-                and_(Document.id == document_id, Document.owner_id == current_user.id)
-            )
+            DELETE_DOCUMENT, {"document_id": document_id, "user_id": current_user.id}
         )
-        document = result.scalar_one_or_none()
+        deleted = result.one_or_none()
         
-        if not document:
+        if deleted is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Document not found"
             )
         
-        await db.delete(document)
         await db.commit()
+        await stats_cache.increment(
+            current_user.id,
+            total_documents=-1,
+            published_documents=-int(deleted.status == DocumentStatus.PUBLISHED),
+            total_words=-(deleted.word_count or 0)
+        )
         
         return {"message": "Document deleted successfully"}
         
-    except HTTPException:
-        raise
-    except Exception as e:
+    except SQLAlchemyError:
         await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to delete document: {str(e)}"
+            detail="Failed to delete document"
         )
 
 
@@ -246,63 +350,89 @@ async def upload_document(
     """Upload a document file."""
     try:
         # Validate file type
-        allowed_types = [
-            "text/plain",
-            "text/markdown",
-            "application/pdf",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        ]
-        
-        if file.content_type not in allowed_types:
+        if file.content_type not in ALLOWED_FILE_TYPES:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Unsupported file type: {file.content_type}"
             )
         
-        # Read file content
-        content = await file.read()
-        
-        # Process based on file type
-        if file.content_type == "text/plain" or file.content_type == "text/markdown":
-            text_content = content.decode("utf-8")
-        else:
-            # For PDF and DOCX, we'd need additional processing
-            # For now, store as binary and mark for processing
-            text_content = f"[Binary file: {file.filename}]"
-        
-        # Create document
-        document_title = title or file.filename or "Uploaded Document"
-        word_count = len(text_content.split()) if text_content else 0
-        
-        document = Document(
-            title=document_title,
-            content=text_content,
-            word_count=word_count,
-            owner_id=current_user.id,
-            file_path=file.filename,
-            file_type=file.content_type,
-            file_size=len(content)
-        )
-        
-        db.add(document)
-        await db.commit()
-        await db.refresh(document)
+        # Copy the upload to disk chunk by chunk, hashing and counting as we go
+        os.makedirs(settings.upload_path, exist_ok=True)
+        extension = os.path.splitext(file.filename or "")[1]
+        stored_path = os.path.join(settings.upload_path, f"{uuid.uuid4().hex}{extension}")
+        
+        is_text = file.content_type in TEXT_FILE_TYPES
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        hasher = hashlib.blake2b()
+        text_parts: List[str] = []
+        file_size = 0
+        words = text_stats.WordCounter()
+        
+        try:
+            async with aiofiles.open(stored_path, "wb") as out:
+                async for chunk in file_iter(file):
+                    file_size += len(chunk)
+                    if file_size > settings.max_file_size:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"File exceeds maximum size of {settings.max_file_size} bytes"
+                        )
+                    hasher.update(chunk)
+                    await out.write(chunk)
+                    
+                    if is_text:
+                        words.feed(chunk)
+                        text_parts.append(decode_text(decoder, chunk))
+            
+            # Process based on file type
+            if is_text:
+                text_parts.append(decode_text(decoder, b"", final=True))
+                text_content = "".join(text_parts)
+                word_count = words.count
+            else:
+                # For PDF and DOCX, we'd need additional processing
+                # For now, store as binary and mark for processing
+                text_content = f"[Binary file: {file.filename}]"
+                word_count = text_stats.word_count(text_content)
+            
+            # Create document
+            result = await db.execute(
+                insert(Document)
+                .values(
+                    title=title or file.filename or "Uploaded Document",
+                    content=text_content,
+                    word_count=word_count,
+                    owner_id=current_user.id,
+                    file_path=stored_path,
+                    file_type=file.content_type,
+                    file_size=file_size
+                )
+                .returning(Document.id)
+            )
+            document_id = result.scalar_one()
+            await db.commit()
+            await stats_cache.increment(
+                current_user.id, total_documents=1, total_words=word_count
+            )
+        except BaseException:
+            if os.path.exists(stored_path):
+                os.remove(stored_path)
+            raise
         
         return {
             "message": "Document uploaded successfully",
-            "document_id": document.id,
+            "document_id": document_id,
             "filename": file.filename,
-            "size": len(content),
-            "type": file.content_type
+            "size": file_size,
+            "type": file.content_type,
+            "checksum": hasher.hexdigest()
         }
         
-    except HTTPException:
-        raise
-    except Exception as e:
+    except (SQLAlchemyError, OSError):
         await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to upload document: {str(e)}"
+            detail="Failed to upload document"
         )
 
 
@@ -314,10 +444,14 @@ async def publish_document(
 ):
     """Publish a document."""
     try:
+        # Generate a simple published URL (in real app, this would be more sophisticated)
         result = await db.execute(
-            select(Document).where(
-                and_(Document.id == document_id, Document.owner_id == current_user.id)
-            )
+            PUBLISH_DOCUMENT,
+            {
+                "document_id": document_id,
+                "user_id": current_user.id,
+                "publish_url": f"/published/{document_id}",
+            }
         )
         document = result.scalar_one_or_none()
         
@@ -327,28 +461,18 @@ async def publish_document(
                 detail="Document not found"
             )
         
-        # Update document status
-        document.status = DocumentStatus.PUBLISHED
-        from datetime import datetime
-        document.published_at = datetime.utcnow()
-        
-        # Generate a simple published URL (in real app, this would be more sophisticated)
-        document.published_url = f"/published/{document.id}"
-        
         await db.commit()
-        await db.refresh(document)
+        await stats_cache.invalidate(current_user.id)
         
         return {
             "message": "Document published successfully",
             "published_url": document.published_url,
-            "published_at": document.published_at.isoformat()
+            "published_at": document.published_at
         }
         
-    except HTTPException:
-        raise
-    except Exception as e:
+    except SQLAlchemyError:
         await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to publish document: {str(e)}"
+            detail="Failed to publish document"
         )
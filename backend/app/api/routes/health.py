@@ -1,51 +1,64 @@
 """Health check endpoints."""
 
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
 from fastapi import APIRouter
 from pydantic import BaseModel
+from sqlalchemy import text
+
+from app.core.config import get_settings
+from app.core.database import get_engine
+from app.services.ai_service import ai_service
 
 router = APIRouter()
+settings = get_settings()
+
+# Last database probe as (monotonic time, response)
+_db_health_cache: Optional[Tuple[float, Dict[str, Any]]] = None
 
 
 class HealthResponse(BaseModel):
     """Health check response model."""
     status: str
     version: str
-    timestamp: str
+    timestamp: datetime
 
 
 @router.get("/", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint."""
-    from datetime import datetime
-    from app.core.config import get_settings
-    
-    settings = get_settings()
-    
     return HealthResponse(
         status="healthy",
         version=settings.app_version,
-        timestamp=datetime.utcnow().isoformat()
+        timestamp=datetime.utcnow()
     )
 
 
 @router.get("/db")
 async def database_health():
     """Database health check."""
-    from app.core.database import engine
+    global _db_health_cache
+    
+    now = time.monotonic()
+    if _db_health_cache is not None and now - _db_health_cache[0] < settings.health_cache_ttl:
+        return _db_health_cache[1]
     
     try:
-        async with engine.begin() as conn:
-            await conn.execute("SELECT 1")
-        return {"status": "healthy", "database": "connected"}
+        async with get_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        health = {"status": "healthy", "database": "connected"}
     except Exception as e:
-        return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
+        health = {"status": "unhealthy", "database": "disconnected", "error": str(e)}
+    
+    _db_health_cache = (now, health)
+    return health
 
 
 @router.get("/ai")
 async def ai_health():
     """AI services health check."""
-    from app.services.ai_service import ai_service
-    
     try:
         providers = ai_service.get_available_providers()
         return {
@@ -1,13 +1,20 @@
 """User management endpoints."""
 
+import hashlib
+from datetime import datetime
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel, EmailStr
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, EmailStr
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core import auth_cache
 from app.core.database import get_db
 from app.api.routes.auth import get_current_user
-from app.models import User, AIProvider
+from app.models import User, AIProvider, AISession, Document, DocumentStatus
+from app.services import stats_cache
 
 router = APIRouter()
 
@@ -36,18 +43,37 @@ class UserProfile(BaseModel):
     preferred_model: str
     is_active: bool
     is_verified: bool
-    created_at: str
+    created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+def _profile_not_modified(request: Request, etag: str) -> bool:
+    """Check the request's If-None-Match header against the profile ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
 
 
 @router.get("/profile", response_model=UserProfile)
 async def get_user_profile(
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
-    """Get current user's profile."""
-    return current_user
+    """Get current user's profile.
+    
+    The ETag hashes the serialized profile, so any change to it yields a new
+    tag; a client whose If-None-Match still matches gets 304 Not Modified.
+    """
+    body = UserProfile.model_validate(current_user).model_dump_json().encode()
+    headers = {"ETag": f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'}
+    
+    if _profile_not_modified(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.put("/profile", response_model=UserProfile)
@@ -58,21 +84,27 @@ async def update_user_profile(
 ):
     """Update user profile."""
     try:
-        # Update fields
-        update_data = user_data.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(current_user, field, value)
+        update_data = user_data.model_dump(exclude_unset=True)
+        if not update_data:
+            return current_user
         
+        result = await db.execute(
+            update(User)
+            .where(User.id == current_user.id)
+            .values(**update_data)
+            .returning(User)
+        )
+        user = result.scalar_one()
         await db.commit()
-        await db.refresh(current_user)
+        await auth_cache.invalidate_user(user.id)
         
-        return current_user
+        return user
         
-    except Exception as e:
+    except SQLAlchemyError:
         await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update profile: {str(e)}"
+            detail="Failed to update profile"
         )
 
 
@@ -82,51 +114,52 @@ async def get_user_stats(
     db: AsyncSession = Depends(get_db)
 ):
     """Get user statistics."""
-    from sqlalchemy import select, func
-    from app.models import Document, AISession
-    
     try:
-        # Get document stats
-        doc_count_result = await db.execute(
-            select(func.count(Document.id)).where(Document.owner_id == current_user.id)
-        )
-        total_documents = doc_count_result.scalar()
-        
-        # Get total word count
-        word_count_result = await db.execute(
-            select(func.sum(Document.word_count)).where(Document.owner_id == current_user.id)
-        )
-        total_words = word_count_result.scalar() or 0
-        
-        # Get AI session count
-        ai_sessions_result = await db.execute(
-            select(func.count(AISession.id)).where(AISession.user_id == current_user.id)
-        )
-        total_ai_sessions = ai_sessions_result.scalar()
-        
-        # Get published documents count
-        published_docs_result = await db.execute(
-            select(func.count(Document.id)).where(
-                Document.owner_id == current_user.id,
-                Document.status == "published"
+        counts = await stats_cache.get(current_user.id)
+        if counts is None:
+            # All counts in one round-trip: document aggregates plus the AI
+            # session count as a scalar subquery
+            ai_session_count = (
+                select(func.count(AISession.id))
+                .where(AISession.user_id == current_user.id)
+                .scalar_subquery()
             )
-        )
-        published_documents = published_docs_result.scalar()
+            result = await db.execute(
+                select(
+                    func.count(Document.id),
+                    func.count(Document.id).filter(
+                        Document.status == DocumentStatus.PUBLISHED
+                    ),
+                    func.coalesce(func.sum(Document.word_count), 0),
+                    ai_session_count,
+                ).where(Document.owner_id == current_user.id)
+            )
+            total_documents, published_documents, total_words, total_ai_sessions = result.one()
+            
+            counts = {
+                "total_documents": total_documents,
+                "published_documents": published_documents,
+                "total_words": total_words,
+                "total_ai_sessions": total_ai_sessions,
+            }
+            await stats_cache.put(current_user.id, counts)
         
-        return {
-            "total_documents": total_documents,
-            "published_documents": published_documents,
-            "draft_documents": total_documents - published_documents,
-            "total_words": total_words,
-            "total_ai_sessions": total_ai_sessions,
+        # Preferences come from the user record, not the cache. Returning the
+        # response directly skips jsonable_encoder on this plain dict.
+        return ORJSONResponse({
+            "total_documents": counts["total_documents"],
+            "published_documents": counts["published_documents"],
+            "draft_documents": counts["total_documents"] - counts["published_documents"],
+            "total_words": counts["total_words"],
+            "total_ai_sessions": counts["total_ai_sessions"],
             "preferred_provider": current_user.preferred_ai_provider.value,
             "preferred_model": current_user.preferred_model
-        }
+        })
         
-    except Exception as e:
+    except SQLAlchemyError:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get user stats: {str(e)}"
+            detail="Failed to get user stats"
         )
 
 
@@ -135,22 +168,33 @@ async def delete_user_account(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Delete user account and all associated data."""
+    """Delete user account.
+    
+    The account is soft-deleted with a single UPDATE: it is deactivated and
+    stamped with ``deleted_at``, so it can no longer log in. Associated
+    documents and sessions are left for an offline purge.
+    """
     try:
         # This is a simplified version. In production, you'd want to:
-        # 1. Soft delete or archive data
-        # 2. Handle related data properly
-        # 3. Send confirmation emails
-        # 4. Implement a grace period
+        # 1. Purge related data in batches from a background job
+        # 2. Send confirmation emails
+        # 3. Implement a grace period
         
-        await db.delete(current_user)
+        user_id = current_user.id
+        await db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(is_active=False, deleted_at=func.now())
+        )
         await db.commit()
+        await auth_cache.invalidate_user(user_id)
+        await stats_cache.invalidate(user_id)
         
         return {"message": "Account deleted successfully"}
         
-    except Exception as e:
+    except SQLAlchemyError:
         await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to delete account: {str(e)}"
+            detail="Failed to delete account"
         )
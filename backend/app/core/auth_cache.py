@@ -0,0 +1,179 @@
+"""Caches for authentication lookups.
+
+get_current_user runs on every authenticated request. These caches let it
+skip re-verifying a token it has already seen and the user lookup for a
+recently authenticated user. Both are per-process, so state that must be
+seen by every worker lives in Redis and is checked in one round trip per
+request:
+
+- a revoked token is stored under a hash of the token until it would have
+  expired anyway, so revocations are never evicted early;
+- changing a user writes a new stamp for them, and a cached user whose
+  stamp no longer matches is loaded again.
+
+When Redis is unavailable each process falls back to what it knows
+itself: its own revocations, and cached users for ``USER_CACHE_TTL``
+seconds.
+"""
+
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import get_redis
+from app.core.security import REFRESH_TOKEN_SECONDS, decode_token, get_user_by_id
+from app.models import User
+
+USER_CACHE_TTL = 30.0
+USER_CACHE_SIZE = 10_000
+TOKEN_CACHE_SIZE = 4096
+# Refresh tokens are the longest-lived tokens issued
+MAX_TOKEN_LIFETIME = REFRESH_TOKEN_SECONDS
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire after a number of seconds."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a live entry, or None if it is missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store an entry, evicting the least recently used one when full."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """Drop an entry if present."""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        self._data.clear()
+
+
+# token -> subject, kept no longer than the token itself is valid
+_token_subjects = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=MAX_TOKEN_LIFETIME)
+# user id -> (stamp, detached User)
+_users = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+# Tokens this process revoked, for when Redis cannot be reached
+_revoked_tokens = TTLCache(maxsize=100_000, ttl=MAX_TOKEN_LIFETIME)
+
+
+def _revoked_key(token: str) -> str:
+    return "auth:revoked:" + hashlib.sha256(token.encode()).hexdigest()
+
+
+def _user_key(user_id: int) -> str:
+    return f"auth:user:{user_id}"
+
+
+def get_token_subject(token: str) -> Optional[str]:
+    """Verify a token and return its subject, reusing recent verifications.
+
+    Revocation is checked by ``is_revoked`` and ``get_user``.
+    """
+    if _revoked_tokens.get(token) is not None:
+        return None
+
+    subject = _token_subjects.get(token)
+    if subject is not None:
+        return subject
+
+    decoded = decode_token(token)
+    if decoded is None:
+        return None
+
+    subject, expires_at = decoded
+    remaining = expires_at - time.time()
+    if remaining > 0:
+        _token_subjects.set(token, subject, ttl=remaining)
+    return subject
+
+
+async def is_revoked(token: str) -> bool:
+    """Check whether a token has been revoked by any process."""
+    if _revoked_tokens.get(token) is not None:
+        return True
+    try:
+        return bool(await get_redis().exists(_revoked_key(token)))
+    except RedisError:
+        return False
+
+
+async def revoke_token(token: str) -> None:
+    """Reject a token from now on, in every process."""
+    _token_subjects.pop(token)
+    decoded = decode_token(token)
+    if decoded is None:
+        return
+    remaining = decoded[1] - time.time()
+    if remaining <= 0:
+        return
+
+    _revoked_tokens.set(token, True, ttl=remaining)
+    try:
+        await get_redis().set(_revoked_key(token), 1, ex=int(remaining) + 1)
+    except RedisError:
+        pass
+
+
+async def get_user(db: AsyncSession, user_id: int, token: str) -> Optional[User]:
+    """Get the user a token belongs to, attached to ``db``.
+
+    Returns None if the token was revoked. Repeat lookups are served from
+    cache until the user's stamp changes.
+    """
+    if _revoked_tokens.get(token) is not None:
+        return None
+
+    cached = _users.get(user_id)
+    try:
+        revoked, stamp = await get_redis().mget(_revoked_key(token), _user_key(user_id))
+    except RedisError:
+        revoked = None
+        stamp = cached[0] if cached is not None else None
+    if revoked is not None:
+        return None
+
+    if cached is not None and cached[0] == stamp:
+        user = cached[1]
+    else:
+        user = await get_user_by_id(db, user_id)
+        if user is None:
+            return None
+        # Keep a detached copy so the cached object never belongs to a session
+        db.expunge(user)
+        _users.set(user_id, (stamp, user))
+    return await db.merge(user, load=False)
+
+
+async def invalidate_user(user_id: int) -> None:
+    """Make every process reload a user after their record changes."""
+    _users.pop(user_id)
+    try:
+        # Entries older than the cache TTL are gone anyway
+        await get_redis().set(_user_key(user_id), uuid.uuid4().hex, ex=int(USER_CACHE_TTL) + 1)
+    except RedisError:
+        pass
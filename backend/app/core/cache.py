@@ -0,0 +1,26 @@
+"""Redis connection management."""
+
+from functools import lru_cache
+
+from redis.asyncio import Redis
+
+from app.core.config import get_settings
+
+
+@lru_cache()
+def get_redis() -> Redis:
+    """Get cached Redis client."""
+    settings = get_settings()
+    return Redis.from_url(
+        settings.redis_url,
+        db=settings.redis_db,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_timeout,
+    )
+
+
+async def close_redis() -> None:
+    """Close Redis connections."""
+    if get_redis.cache_info().currsize:
+        await get_redis().aclose()
+        get_redis.cache_clear()
@@ -1,100 +1,216 @@
 """Authentication and security utilities."""
 
-from datetime import datetime, timedelta
-from typing import Any, Union, Optional
-
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Optional, Tuple, Union
+
+import bcrypt
+import jwt
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import Row, bindparam, func, insert, select, update
 
 from app.core.config import get_settings
 from app.models import User
 
 settings = get_settings()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_DECODE_OPTIONS = {"require": ["exp", "sub"]}
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def reload_security_settings() -> None:
+    """Snapshot the token and hashing settings into module globals.
+    
+    Token and password functions read these globals rather than going
+    through the settings object on every call. This runs at import; call
+    it again after changing settings (e.g. in tests, once
+    ``get_settings.cache_clear()`` has been called). The hashing thread
+    pool keeps the size it was created with.
+    """
+    global settings, SECRET_KEY, ALGORITHM, _ALGORITHMS, ACCESS_TOKEN_SECONDS
+    global REFRESH_TOKEN_SECONDS, BCRYPT_ROUNDS, _HEADER_SEGMENT, _HMAC_SIGNER
+    global _dummy_hash
+    settings = get_settings()
+    SECRET_KEY = settings.secret_key
+    ALGORITHM = settings.algorithm
+    _ALGORITHMS = [ALGORITHM]
+    ACCESS_TOKEN_SECONDS = settings.access_token_expire_minutes * 60
+    REFRESH_TOKEN_SECONDS = settings.refresh_token_expire_days * 24 * 60 * 60
+    BCRYPT_ROUNDS = settings.bcrypt_rounds
+    # Rebuilt on next use so it matches the current cost
+    _dummy_hash = None
+    # Every token shares the same header, and for HMAC algorithms the keyed
+    # state can be prepared once and copied per token
+    _HEADER_SEGMENT = _b64url(orjson.dumps({"alg": ALGORITHM, "typ": "JWT"}))
+    _HMAC_SIGNER = (
+        hmac.new(SECRET_KEY.encode("utf-8"), digestmod=_HMAC_DIGESTS[ALGORITHM])
+        if ALGORITHM in _HMAC_DIGESTS
+        else None
+    )
+
+
+reload_security_settings()
+
+# bcrypt only reads the first 72 bytes of a password
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+# bcrypt releases the GIL, so hashing on threads runs in parallel across
+# cores without blocking the event loop, and without the pickling and worker
+# startup a process pool would add
+_HASH_POOL = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers or os.cpu_count() or 1,
+    thread_name_prefix="password-hash",
+)
+
+
+def _encode_password(password: str) -> bytes:
+    return password.encode("utf-8")[:BCRYPT_MAX_PASSWORD_BYTES]
+
+
+def _check_password(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return bcrypt.checkpw(
+            _encode_password(plain_password), hashed_password.encode("utf-8")
+        )
+    except ValueError:
+        # Not a bcrypt hash we can read
+        return False
+
+
+def _hash_password(password: str) -> str:
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return bcrypt.hashpw(_encode_password(password), salt).decode("utf-8")
+
+
+async def _get_dummy_hash() -> str:
+    """Get a hash to check passwords against when no user matched.
+    
+    Checking it makes a login for an unknown email cost the same bcrypt
+    work as a wrong password, so response times do not reveal which
+    emails are registered. Built once, on the first miss.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await get_password_hash(secrets.token_urlsafe(32))
+    return _dummy_hash
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _HASH_POOL, _check_password, plain_password, hashed_password
+    )
 
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """Generate password hash."""
-    return pwd_context.hash(password)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_HASH_POOL, _hash_password, password)
+
+
+def _encode_token(claims: dict) -> str:
+    """Sign claims into a compact JWT."""
+    if _HMAC_SIGNER is None:
+        return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+    signing_input = _HEADER_SEGMENT + b"." + _b64url(orjson.dumps(claims))
+    signer = _HMAC_SIGNER.copy()
+    signer.update(signing_input)
+    return (signing_input + b"." + _b64url(signer.digest())).decode("ascii")
 
 
 def create_access_token(
     subject: Union[str, Any], expires_delta: Optional[timedelta] = None
 ) -> str:
     """Create access token."""
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(
-            minutes=settings.access_token_expire_minutes
-        )
-    
-    to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(
-        to_encode, settings.secret_key, algorithm=settings.algorithm
-    )
-    return encoded_jwt
+    lifetime = expires_delta.total_seconds() if expires_delta else ACCESS_TOKEN_SECONDS
+    to_encode = {"exp": int(time.time() + lifetime), "sub": str(subject)}
+    return _encode_token(to_encode)
 
 
 def create_refresh_token(subject: Union[str, Any]) -> str:
     """Create refresh token."""
-    expire = datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
-    to_encode = {"exp": expire, "sub": str(subject), "type": "refresh"}
-    encoded_jwt = jwt.encode(
-        to_encode, settings.secret_key, algorithm=settings.algorithm
-    )
-    return encoded_jwt
+    to_encode = {
+        "exp": int(time.time() + REFRESH_TOKEN_SECONDS),
+        "sub": str(subject),
+        "type": "refresh",
+    }
+    return _encode_token(to_encode)
 
 
-def verify_token(token: str) -> Optional[str]:
-    """Verify and decode token."""
+def decode_token(token: str) -> Optional[Tuple[str, float]]:
+    """Verify a token and return its subject and expiry timestamp."""
     try:
         payload = jwt.decode(
-            token, settings.secret_key, algorithms=[settings.algorithm]
+            token, SECRET_KEY, algorithms=_ALGORITHMS, options=_DECODE_OPTIONS
         )
-        token_subject: str = payload.get("sub")
-        if token_subject is None:
-            return None
-        return token_subject
-    except JWTError:
+    except jwt.PyJWTError:
         return None
+    return payload["sub"], payload["exp"]
+
+
+def verify_token(token: str) -> Optional[str]:
+    """Verify and decode token."""
+    decoded = decode_token(token)
+    return decoded[0] if decoded else None
+
+
+# User lookups run on nearly every request, so their statements are built
+# once and take their values as bound parameters
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+USER_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+USER_CREDENTIALS_BY_EMAIL = select(
+    User.id, User.hashed_password, User.is_active
+).where(User.email == bindparam("email"))
+TOUCH_USER = (
+    update(User)
+    .where(User.id == bindparam("user_id"))
+    .values(updated_at=func.now())
+    .execution_options(synchronize_session=False)
+)
 
 
 async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     """Get user by email."""
-    result = await db.execute(select(User).where(User.email == email))
+    result = await db.execute(USER_BY_EMAIL, {"email": email})
     return result.scalar_one_or_none()
 
 
 async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
     """Get user by username."""
-    result = await db.execute(select(User).where(User.username == username))
+    result = await db.execute(USER_BY_USERNAME, {"username": username})
     return result.scalar_one_or_none()
 
 
 async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
-    """Get user by ID."""
-    result = await db.execute(select(User).where(User.id == user_id))
-    return result.scalar_one_or_none()
+    """Get user by ID, from the session's identity map when already loaded."""
+    return await db.get(User, user_id)
 
 
 async def authenticate_user(
     db: AsyncSession, email: str, password: str
-) -> Optional[User]:
-    """Authenticate user with email and password."""
-    user = await get_user_by_email(db, email)
-    if not user:
-        return None
-    if not verify_password(password, user.hashed_password):
+) -> Optional[Row]:
+    """Authenticate user with email and password.
+    
+    Returns the user's ``id`` and ``is_active``, which is all login needs,
+    so no User object is loaded.
+    """
+    result = await db.execute(USER_CREDENTIALS_BY_EMAIL, {"email": email})
+    user = result.one_or_none()
+    hashed_password = user.hashed_password if user else await _get_dummy_hash()
+    if not await verify_password(password, hashed_password) or not user:
         return None
     return user
 
@@ -107,22 +223,24 @@ async def create_user(
     full_name: Optional[str] = None,
 ) -> User:
     """Create new user."""
-    hashed_password = get_password_hash(password)
-    db_user = User(
-        email=email,
-        username=username,
-        full_name=full_name,
-        hashed_password=hashed_password,
+    hashed_password = await get_password_hash(password)
+    # RETURNING hands back server defaults without a reload after commit
+    result = await db.execute(
+        insert(User)
+        .values(
+            email=email,
+            username=username,
+            full_name=full_name,
+            hashed_password=hashed_password,
+        )
+        .returning(User)
     )
-    db.add(db_user)
+    db_user = result.scalar_one()
     await db.commit()
-    await db.refresh(db_user)
     return db_user
 
 
 async def update_user_last_login(db: AsyncSession, user_id: int) -> None:
     """Update user's last login timestamp."""
-    user = await get_user_by_id(db, user_id)
-    if user:
-        user.updated_at = datetime.utcnow()
-        await db.commit()
+    await db.execute(TOUCH_USER, {"user_id": user_id})
+    await db.commit()
@@ -1,15 +1,21 @@
 """ScribeFlow FastAPI Application."""
 
+import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from sqlalchemy.exc import SQLAlchemyError
 
+from app.core.cache import close_redis
 from app.core.config import get_settings
 from app.core.database import init_db, close_db
 from app.api.router import api_router
+from app.services.ai_service import ai_service
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
@@ -17,8 +23,11 @@ async def lifespan(app: FastAPI):
     """Application lifespan events."""
     # Startup
     await init_db()
+    ai_service.warm_up()
     yield
     # Shutdown
+    await ai_service.close()
+    await close_redis()
     await close_db()
 
 
@@ -31,7 +40,8 @@ def create_app() -> FastAPI:
         version=settings.app_version,
         docs_url="/docs" if settings.debug else None,
         redoc_url="/redoc" if settings.debug else None,
-        lifespan=lifespan
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse
     )
 
     # CORS Middleware
@@ -46,6 +56,15 @@ def create_app() -> FastAPI:
     # Include API routes
     app.include_router(api_router, prefix=settings.api_prefix)
 
+    @app.exception_handler(SQLAlchemyError)
+    async def database_error_handler(request: Request, exc: SQLAlchemyError):
+        """Answer database errors no route handled, without leaking driver details."""
+        logger.error("Database error on %s %s", request.method, request.url.path, exc_info=exc)
+        return ORJSONResponse(
+            status_code=500,
+            content={"detail": "Database error"}
+        )
+
     @app.get("/")
     async def root():
         """Root endpoint."""
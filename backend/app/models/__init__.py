@@ -3,27 +3,79 @@
 from datetime import datetime
 from typing import Optional, List
 from sqlalchemy import (
+    DDL,
     Boolean,
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     JSON,
-    Enum as SQLEnum,
+    SmallInteger,
+    TypeDecorator,
+    event,
     func,
 )
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 import enum
 
 from app.core.database import Base
 
 
+class OrdinalEnum(TypeDecorator):
+    """Store an Enum member as its SMALLINT position in the Enum.
+    
+    Members keep their string values in Python and the API; only the
+    column holds the number, so new members must be appended, never
+    inserted or reordered.
+    """
+    impl = SmallInteger
+    cache_ok = True
+    
+    def __init__(self, enum_class: type):
+        super().__init__()
+        self.enum_class = enum_class
+        self._members = tuple(enum_class)
+        self._positions = {member: position for position, member in enumerate(self._members)}
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return self._positions[self.enum_class(value)]
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self._members[int(value)]
+
+
+# PostgreSQL stores JSON columns as binary JSONB, which is parsed once on
+# write and can be indexed; other databases keep plain JSON
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
+
+# SQLite's CURRENT_TIMESTAMP writes whole seconds with no fraction, so bound
+# values use the same text form; otherwise "12:00:00" < "12:00:00.000000"
+# and equal timestamps never compare equal
+Timestamp = DateTime().with_variant(
+    sqlite.DATETIME(
+        storage_format="%(year)04d-%(month)02d-%(day)02d "
+        "%(hour)02d:%(minute)02d:%(second)02d"
+    ),
+    "sqlite",
+)
+
+
 class TimestampMixin:
     """Mixin for timestamp fields."""
-    created_at = Column(DateTime, default=func.now(), nullable=False)
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+    created_at = Column(Timestamp, default=func.now(), server_default=func.now(), nullable=False)
+    updated_at = Column(
+        Timestamp, default=func.now(), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
 
 
 class DocumentStatus(enum.Enum):
@@ -52,6 +104,7 @@ class User(Base, TimestampMixin):
     hashed_password = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
     is_verified = Column(Boolean, default=False, nullable=False)
+    deleted_at = Column(DateTime, nullable=True)  # Set when the account is soft-deleted
     
     # Profile information
     avatar_url = Column(String(255), nullable=True)
@@ -60,7 +113,7 @@ class User(Base, TimestampMixin):
     website = Column(String(255), nullable=True)
     
     # Preferences
-    preferred_ai_provider = Column(SQLEnum(AIProvider), default=AIProvider.OPENAI)
+    preferred_ai_provider = Column(OrdinalEnum(AIProvider), default=AIProvider.OPENAI)
     preferred_model = Column(String(100), default="gpt-4")
     
     # OAuth information
@@ -75,15 +128,31 @@ class User(Base, TimestampMixin):
 class Document(Base, TimestampMixin):
     """Document model."""
     __tablename__ = "documents"
+    __table_args__ = (
+        # Serves the per-owner listing ordered by updated_at
+        Index("ix_documents_owner_updated", "owner_id", "updated_at"),
+        # Covers the per-owner /stats aggregates without touching the table
+        Index("ix_documents_owner_status", "owner_id", "status", "word_count"),
+        # Trigram indexes let PostgreSQL answer ILIKE '%term%' searches
+        *(
+            Index(
+                f"ix_documents_{column}_trgm",
+                column,
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+            ).ddl_if(dialect="postgresql")
+            for column in ("title", "description", "content")
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
     content = Column(Text, nullable=True)
-    status = Column(SQLEnum(DocumentStatus), default=DocumentStatus.DRAFT)
+    status = Column(OrdinalEnum(DocumentStatus), default=DocumentStatus.DRAFT)
     
     # Metadata
     description = Column(Text, nullable=True)
-    tags = Column(JSON, default=list)  # List of strings
+    tags = Column(JSONDocument, default=list)  # List of strings
     word_count = Column(Integer, default=0)
     
     # Ownership
@@ -104,25 +173,38 @@ class Document(Base, TimestampMixin):
     code_blocks = relationship("CodeBlock", back_populates="document")
 
 
+event.listen(
+    Document.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+
 class AISession(Base, TimestampMixin):
     """AI interaction session model."""
     __tablename__ = "ai_sessions"
+    __table_args__ = (
+        # Lets PostgreSQL answer containment queries over conversation history
+        Index(
+            "ix_ai_sessions_messages_gin", "messages", postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String(100), unique=True, index=True, nullable=False)
     
     # AI Configuration
-    provider = Column(SQLEnum(AIProvider), nullable=False)
+    provider = Column(OrdinalEnum(AIProvider), nullable=False)
     model = Column(String(100), nullable=False)
     temperature = Column(String(10), default="0.7")
     max_tokens = Column(Integer, default=4000)
     
     # Session data
-    messages = Column(JSON, default=list)  # Conversation history
+    messages = Column(JSONDocument, default=list)  # Conversation history
     context = Column(Text, nullable=True)  # Document context
     
     # Relationships
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=True)
     
     user = relationship("User", back_populates="ai_sessions")
@@ -160,7 +242,7 @@ class Template(Base, TimestampMixin):
     
     # Template metadata
     category = Column(String(100), nullable=True)
-    tags = Column(JSON, default=list)
+    tags = Column(JSONDocument, default=list)
     is_public = Column(Boolean, default=False)
     
     # Usage statistics
@@ -177,7 +259,7 @@ class APIKey(Base, TimestampMixin):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
-    provider = Column(SQLEnum(AIProvider), nullable=False)
+    provider = Column(OrdinalEnum(AIProvider), nullable=False)
     key_hash = Column(String(255), nullable=False)  # Encrypted API key
     is_active = Column(Boolean, default=True)
     
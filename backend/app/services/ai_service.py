@@ -1,11 +1,15 @@
 """AI service for managing multiple AI providers."""
 
 import asyncio
-from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any, AsyncGenerator
+import contextlib
+import functools
+import threading
+from typing import Dict, List, Optional, Any, AsyncGenerator, AsyncIterator, Protocol, Tuple
 from enum import Enum
 
+import httpx
 import openai
+import orjson
 import anthropic
 import google.generativeai as genai
 import cohere
@@ -13,6 +17,72 @@ import cohere
 from app.core.config import get_settings, get_ai_config
 
 
+_settings = get_settings()
+
+# Shared connection pool settings for HTTP-based provider SDKs
+_HTTP_LIMITS = httpx.Limits(
+    max_connections=_settings.ai_http_max_connections,
+    max_keepalive_connections=_settings.ai_http_max_keepalive,
+)
+_HTTP_TIMEOUT = httpx.Timeout(_settings.ai_http_timeout, connect=10.0)
+
+
+def _use_orjson_in_httpx() -> None:
+    """Encode httpx request bodies with orjson.
+    
+    The OpenAI and Anthropic SDKs build their JSON bodies through httpx.
+    Payloads orjson rejects fall back to the stdlib path. NaN and infinity
+    are not rejected: orjson sends them as null, where the stdlib would
+    emit tokens that are not valid JSON. Nothing is patched if httpx's
+    internals are not the ones this was written against.
+    """
+    content = getattr(httpx, "_content", None)
+    stdlib_encode_json = getattr(content, "encode_json", None)
+    if stdlib_encode_json is None or getattr(stdlib_encode_json, "_orjson", False):
+        return
+    
+    def encode_json(json: Any):
+        try:
+            body = orjson.dumps(json)
+        except TypeError:
+            return stdlib_encode_json(json)
+        headers = {"Content-Length": str(len(body)), "Content-Type": "application/json"}
+        return headers, httpx.ByteStream(body)
+    
+    encode_json._orjson = True
+    content.encode_json = encode_json
+
+
+def _orjson_response_json(response: httpx.Response, **kwargs: Any) -> Any:
+    """Parse a response body with orjson, falling back to the stdlib."""
+    if not kwargs:
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            pass
+    return httpx.Response.json(response, **kwargs)
+
+
+async def _parse_json_with_orjson(response: httpx.Response) -> None:
+    """Response hook pointing ``response.json`` at orjson for this response."""
+    response.json = functools.partial(_orjson_response_json, response)
+
+
+_use_orjson_in_httpx()
+
+# Speaker labels for providers that take a single plain-text prompt
+_ROLE_PREFIX = {"system": "System: ", "user": "Human: ", "assistant": "Assistant: "}
+
+
+def _messages_to_prompt(messages: List[Dict[str, str]]) -> str:
+    """Flatten chat messages into a labelled prompt, skipping unknown roles."""
+    return "\n\n".join(
+        _ROLE_PREFIX[role] + message.get("content", "")
+        for message in messages
+        if (role := message.get("role", "user")) in _ROLE_PREFIX
+    )
+
+
 class AIProvider(Enum):
     """AI provider enumeration."""
     OPENAI = "openai"
@@ -21,47 +91,67 @@ class AIProvider(Enum):
     COHERE = "cohere"
 
 
-class BaseAIClient(ABC):
-    """Abstract base class for AI clients."""
+class BaseAIClient(Protocol):
+    """Interface shared by the provider clients."""
     
-    def __init__(self, api_key: str, model: str):
-        self.api_key = api_key
-        self.model = model
+    model: str
     
-    @abstractmethod
     async def chat_completion(
         self, 
         messages: List[Dict[str, str]], 
         **kwargs
     ) -> str:
         """Generate chat completion."""
-        pass
+        ...
     
-    @abstractmethod
-    async def stream_completion(
+    def stream_completion(
         self, 
         messages: List[Dict[str, str]], 
         **kwargs
     ) -> AsyncGenerator[str, None]:
         """Generate streaming chat completion."""
-        pass
+        ...
+
+
+class _ProviderClient:
+    """Common state of the provider clients, kept in slots."""
+    
+    __slots__ = ("api_key", "model", "client")
+    
+    def __init__(self, api_key: str, model: str):
+        self.api_key = api_key
+        self.model = model
 
 
-class OpenAIClient(BaseAIClient):
+class OpenAIClient(_ProviderClient):
     """OpenAI client implementation."""
     
-    def __init__(self, api_key: str, model: str = "gpt-4"):
+    __slots__ = ()
+    
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-4",
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
         super().__init__(api_key, model)
-        self.client = openai.AsyncOpenAI(api_key=api_key)
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key, http_client=http_client, timeout=_HTTP_TIMEOUT
+        )
     
     async def chat_completion(
         self, 
         messages: List[Dict[str, str]], 
         temperature: float = 0.7,
         max_tokens: int = 4000,
+        cache_prefix: bool = False,
         **kwargs
     ) -> str:
-        """Generate chat completion using OpenAI."""
+        """Generate chat completion using OpenAI.
+        
+        OpenAI caches long stable prefixes automatically, so
+        ``cache_prefix`` needs no request changes here.
+        """
         try:
             response = await self.client.chat.completions.create(
                 model=self.model,
@@ -79,6 +169,7 @@ class OpenAIClient(BaseAIClient):
         messages: List[Dict[str, str]], 
         temperature: float = 0.7,
         max_tokens: int = 4000,
+        cache_prefix: bool = False,
         **kwargs
     ) -> AsyncGenerator[str, None]:
         """Generate streaming chat completion using OpenAI."""
@@ -98,22 +189,35 @@ class OpenAIClient(BaseAIClient):
             raise Exception(f"OpenAI API error: {str(e)}")
 
 
-class AnthropicClient(BaseAIClient):
+class AnthropicClient(_ProviderClient):
     """Anthropic client implementation."""
     
-    def __init__(self, api_key: str, model: str = "claude-3-sonnet-20240229"):
+    __slots__ = ()
+    
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "claude-3-sonnet-20240229",
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
         super().__init__(api_key, model)
-        self.client = anthropic.AsyncAnthropic(api_key=api_key)
+        self.client = anthropic.AsyncAnthropic(
+            api_key=api_key, http_client=http_client, timeout=_HTTP_TIMEOUT
+        )
     
     async def chat_completion(
         self, 
         messages: List[Dict[str, str]], 
         temperature: float = 0.7,
         max_tokens: int = 4000,
+        cache_prefix: bool = False,
         **kwargs
     ) -> str:
         """Generate chat completion using Anthropic."""
         try:
+            system, messages = self._split_messages(messages, cache_prefix)
+            if system:
+                kwargs["system"] = system
             response = await self.client.messages.create(
                 model=self.model,
                 max_tokens=max_tokens,
@@ -130,10 +234,14 @@ class AnthropicClient(BaseAIClient):
         messages: List[Dict[str, str]], 
         temperature: float = 0.7,
         max_tokens: int = 4000,
+        cache_prefix: bool = False,
         **kwargs
     ) -> AsyncGenerator[str, None]:
         """Generate streaming chat completion using Anthropic."""
         try:
+            system, messages = self._split_messages(messages, cache_prefix)
+            if system:
+                kwargs["system"] = system
             response = await self.client.messages.create(
                 model=self.model,
                 max_tokens=max_tokens,
@@ -147,11 +255,47 @@ class AnthropicClient(BaseAIClient):
                     yield chunk.delta.text
         except Exception as e:
             raise Exception(f"Anthropic API error: {str(e)}")
+    
+    def _split_messages(
+        self, messages: List[Dict[str, str]], cache_prefix: bool
+    ) -> Tuple[Any, List[Dict[str, Any]]]:
+        """Split system prompts out of messages for the Anthropic API.
+        
+        With ``cache_prefix`` the system prompt and the conversation up to
+        the final turn are marked as cache breakpoints, so repeated
+        prefixes are served from Anthropic's prompt cache.
+        """
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        chat_messages: List[Dict[str, Any]] = [
+            m for m in messages if m["role"] != "system"
+        ]
+        if not cache_prefix:
+            return system, chat_messages
+        
+        if system:
+            system = [
+                {"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}
+            ]
+        if len(chat_messages) > 1:
+            prefix_end = chat_messages[-2]
+            chat_messages[-2] = {
+                "role": prefix_end["role"],
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prefix_end["content"],
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+            }
+        return system, chat_messages
 
 
-class GoogleAIClient(BaseAIClient):
+class GoogleAIClient(_ProviderClient):
     """Google AI client implementation."""
     
+    __slots__ = ()
+    
     def __init__(self, api_key: str, model: str = "gemini-pro"):
         super().__init__(api_key, model)
         genai.configure(api_key=api_key)
@@ -162,12 +306,13 @@ class GoogleAIClient(BaseAIClient):
         messages: List[Dict[str, str]], 
         temperature: float = 0.7,
         max_tokens: int = 4000,
+        cache_prefix: bool = False,
         **kwargs
     ) -> str:
         """Generate chat completion using Google AI."""
         try:
             # Convert messages to Google AI format
-            prompt = self._convert_messages_to_prompt(messages)
+            prompt = _messages_to_prompt(messages)
             
             generation_config = genai.types.GenerationConfig(
                 temperature=temperature,
@@ -188,11 +333,12 @@ class GoogleAIClient(BaseAIClient):
         messages: List[Dict[str, str]], 
         temperature: float = 0.7,
         max_tokens: int = 4000,
+        cache_prefix: bool = False,
         **kwargs
     ) -> AsyncGenerator[str, None]:
         """Generate streaming chat completion using Google AI."""
         try:
-            prompt = self._convert_messages_to_prompt(messages)
+            prompt = _messages_to_prompt(messages)
             
             generation_config = genai.types.GenerationConfig(
                 temperature=temperature,
@@ -211,25 +357,13 @@ class GoogleAIClient(BaseAIClient):
                     yield chunk.text
         except Exception as e:
             raise Exception(f"Google AI API error: {str(e)}")
-    
-    def _convert_messages_to_prompt(self, messages: List[Dict[str, str]]) -> str:
-        """Convert messages to Google AI prompt format."""
-        prompt_parts = []
-        for message in messages:
-            role = message.get("role", "user")
-            content = message.get("content", "")
-            if role == "system":
-                prompt_parts.append(f"System: {content}")
-            elif role == "user":
-                prompt_parts.append(f"Human: {content}")
-            elif role == "assistant":
-                prompt_parts.append(f"Assistant: {content}")
-        return "\n\n".join(prompt_parts)
-
-
-class CohereClient(BaseAIClient):
+
+
+class CohereClient(_ProviderClient):
     """Cohere client implementation."""
     
+    __slots__ = ()
+    
     def __init__(self, api_key: str, model: str = "command"):
         super().__init__(api_key, model)
         self.client = cohere.AsyncClient(api_key)
@@ -239,12 +373,13 @@ class CohereClient(BaseAIClient):
         messages: List[Dict[str, str]], 
         temperature: float = 0.7,
         max_tokens: int = 4000,
+        cache_prefix: bool = False,
         **kwargs
     ) -> str:
         """Generate chat completion using Cohere."""
         try:
             # Convert messages to Cohere format
-            prompt = self._convert_messages_to_prompt(messages)
+            prompt = _messages_to_prompt(messages)
             
             response = await self.client.generate(
                 model=self.model,
@@ -262,11 +397,12 @@ class CohereClient(BaseAIClient):
         messages: List[Dict[str, str]], 
         temperature: float = 0.7,
         max_tokens: int = 4000,
+        cache_prefix: bool = False,
         **kwargs
     ) -> AsyncGenerator[str, None]:
         """Generate streaming chat completion using Cohere."""
         try:
-            prompt = self._convert_messages_to_prompt(messages)
+            prompt = _messages_to_prompt(messages)
             
             response = await self.client.generate(
                 model=self.model,
@@ -282,20 +418,64 @@ class CohereClient(BaseAIClient):
                     yield chunk.text
         except Exception as e:
             raise Exception(f"Cohere API error: {str(e)}")
+
+
+_STREAM_END = object()
+
+
+async def _pump_stream(source: AsyncIterator[str], queue: asyncio.Queue) -> None:
+    """Copy a provider stream into ``queue``, ending with ``_STREAM_END``.
+    
+    A provider error is queued in place of the end marker.
+    """
+    try:
+        async with contextlib.aclosing(source):
+            async for chunk in source:
+                await queue.put(chunk)
+    except Exception as e:
+        await queue.put(e)
+    else:
+        await queue.put(_STREAM_END)
+
+
+async def _coalesce_chunks(
+    queue: asyncio.Queue, max_bytes: int, max_delay: float
+) -> AsyncGenerator[str, None]:
+    """Yield queued chunks, joining those that arrive within ``max_delay``.
     
-    def _convert_messages_to_prompt(self, messages: List[Dict[str, str]]) -> str:
-        """Convert messages to Cohere prompt format."""
-        prompt_parts = []
-        for message in messages:
-            role = message.get("role", "user")
-            content = message.get("content", "")
-            if role == "system":
-                prompt_parts.append(f"System: {content}")
-            elif role == "user":
-                prompt_parts.append(f"Human: {content}")
-            elif role == "assistant":
-                prompt_parts.append(f"Assistant: {content}")
-        return "\n\n".join(prompt_parts)
+    A joined chunk is sent once it reaches ``max_bytes`` or ``max_delay``
+    seconds after its first part arrived.
+    """
+    loop = asyncio.get_running_loop()
+    item = await queue.get()
+    while item is not _STREAM_END:
+        if isinstance(item, Exception):
+            raise item
+        
+        parts = [item]
+        size = len(item)
+        deadline = loop.time() + max_delay
+        item = None
+        while size < max_bytes:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is _STREAM_END or isinstance(item, Exception):
+                break
+            parts.append(item)
+            size += len(item)
+            item = None
+        
+        yield "".join(parts)
+        if item is None:
+            item = await queue.get()
 
 
 class AIService:
@@ -304,32 +484,51 @@ class AIService:
     def __init__(self):
         self.settings = get_settings()
         self.ai_config = get_ai_config()
-        self._clients: Dict[str, BaseAIClient] = {}
+        self._clients: Dict[Tuple[str, str], BaseAIClient] = {}
+        self._clients_lock = threading.Lock()
+        self._http_client: Optional[httpx.AsyncClient] = None
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Get the HTTP/2 connection pool shared by all provider clients."""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                http2=True,
+                limits=_HTTP_LIMITS,
+                timeout=_HTTP_TIMEOUT,
+                event_hooks={"response": [_parse_json_with_orjson]},
+            )
+        return self._http_client
     
     def _get_client(self, provider: str, model: Optional[str] = None) -> BaseAIClient:
         """Get or create AI client for provider."""
-        cache_key = f"{provider}:{model or 'default'}"
-        
-        if cache_key not in self._clients:
-            config = self.ai_config.get(provider)
-            if not config or not config.get("api_key"):
-                raise ValueError(f"API key not configured for provider: {provider}")
-            
-            api_key = config["api_key"]
-            model = model or config["models"][0]
-            
-            if provider == AIProvider.OPENAI.value:
-                self._clients[cache_key] = OpenAIClient(api_key, model)
-            elif provider == AIProvider.ANTHROPIC.value:
-                self._clients[cache_key] = AnthropicClient(api_key, model)
-            elif provider == AIProvider.GOOGLE.value:
-                self._clients[cache_key] = GoogleAIClient(api_key, model)
-            elif provider == AIProvider.COHERE.value:
-                self._clients[cache_key] = CohereClient(api_key, model)
-            else:
-                raise ValueError(f"Unsupported AI provider: {provider}")
+        config = self.ai_config.get(provider)
+        if not config or not config.get("api_key"):
+            raise ValueError(f"API key not configured for provider: {provider}")
         
-        return self._clients[cache_key]
+        # Key by the resolved model so the default and the same model named
+        # explicitly share one client
+        cache_key = (provider, model or config["models"][0])
+        client = self._clients.get(cache_key)
+        if client is None:
+            # Double-checked so concurrent first calls build a single client
+            with self._clients_lock:
+                client = self._clients.get(cache_key)
+                if client is None:
+                    client = self._build_client(provider, config["api_key"], cache_key[1])
+                    self._clients[cache_key] = client
+        return client
+    
+    def _build_client(self, provider: str, api_key: str, model: str) -> BaseAIClient:
+        """Create a provider client."""
+        if provider == AIProvider.OPENAI.value:
+            return OpenAIClient(api_key, model, http_client=self._get_http_client())
+        if provider == AIProvider.ANTHROPIC.value:
+            return AnthropicClient(api_key, model, http_client=self._get_http_client())
+        if provider == AIProvider.GOOGLE.value:
+            return GoogleAIClient(api_key, model)
+        if provider == AIProvider.COHERE.value:
+            return CohereClient(api_key, model)
+        raise ValueError(f"Unsupported AI provider: {provider}")
     
     async def chat_completion(
         self,
@@ -350,11 +549,46 @@ class AIService:
         model: str = None,
         **kwargs
     ) -> AsyncGenerator[str, None]:
-        """Generate streaming chat completion using specified provider."""
+        """Generate streaming chat completion using specified provider.
+        
+        A background task reads the provider stream into a bounded queue, so
+        the provider keeps being read while the caller is still writing
+        earlier chunks to its client. Chunks that arrive close together are
+        joined, so the caller sees fewer, larger chunks.
+        """
         provider = provider or self.settings.default_ai_provider
         client = self._get_client(provider, model)
-        async for chunk in client.stream_completion(messages, **kwargs):
-            yield chunk
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.settings.stream_queue_size)
+        producer = asyncio.create_task(
+            _pump_stream(client.stream_completion(messages, **kwargs), queue)
+        )
+        try:
+            async for chunk in _coalesce_chunks(
+                queue,
+                self.settings.stream_chunk_bytes,
+                self.settings.stream_flush_ms / 1000,
+            ):
+                yield chunk
+        finally:
+            producer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await producer
+    
+    def warm_up(self) -> None:
+        """Create the shared pool and default clients for configured providers.
+        
+        Called at startup so the first AI request does not pay for SDK client
+        construction.
+        """
+        for provider in self.get_available_providers():
+            self._get_client(provider)
+    
+    async def close(self) -> None:
+        """Close pooled provider connections."""
+        self._clients.clear()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
     
     def get_available_providers(self) -> List[str]:
         """Get list of available AI providers."""
@@ -364,12 +598,12 @@ class AIService:
                 available.append(provider)
         return available
     
-    def get_available_models(self, provider: str) -> List[str]:
-        """Get list of available models for provider."""
+    def get_available_models(self, provider: str) -> Tuple[str, ...]:
+        """Get available models for provider."""
         config = self.ai_config.get(provider)
         if config:
-            return config.get("models", [])
-        return []
+            return config.get("models", ())
+        return ()
 
 
 # Global AI service instance
@@ -0,0 +1,79 @@
+"""Sliding-window limits on failed login attempts, kept in Redis.
+
+Every login attempt costs a bcrypt check, so logins are refused before the
+password is verified once there have been too many recent failures for the
+email from the same client IP, for the email from any IP, or from the IP.
+The email-wide cap is much looser than the per-IP one, so a third party
+sending bad passwords for an email cannot lock its owner out for long.
+Successful logins are not counted and clear the email's failures from
+that IP. Each key is a sorted set of failure timestamps trimmed to the
+window. When Redis is unavailable logins are allowed through.
+
+The client IP is ``request.client.host``. Behind a reverse proxy that is
+the proxy's address unless uvicorn is told to trust its X-Forwarded-For
+header with ``--forwarded-allow-ips`` (``FORWARDED_ALLOW_IPS``).
+"""
+
+import time
+import uuid
+from typing import Dict, Optional
+
+from redis.exceptions import RedisError
+
+from app.core.cache import get_redis
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+def _limits(email: str, client_ip: Optional[str]) -> Dict[str, int]:
+    email = email.lower()
+    limits = {f"login:email:{email}": settings.login_attempts_per_account}
+    if client_ip:
+        limits[f"login:email_ip:{email}:{client_ip}"] = settings.login_attempts_per_email
+        limits[f"login:ip:{client_ip}"] = settings.login_attempts_per_ip
+    return limits
+
+
+async def allow(email: str, client_ip: Optional[str]) -> bool:
+    """False if the email or IP has too many recent failed logins."""
+    limits = _limits(email, client_ip)
+    now = time.time()
+    
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            for key in limits:
+                pipe.zremrangebyscore(key, 0, now - settings.login_attempt_window)
+                pipe.zcard(key)
+            results = await pipe.execute()
+    except RedisError:
+        return True
+    
+    # Every key queued two commands; the second is its failure count
+    counts = results[1::2]
+    return all(count < limit for count, limit in zip(counts, limits.values()))
+
+
+async def record_failure(email: str, client_ip: Optional[str]) -> None:
+    """Count a failed login against the email and the client IP."""
+    now = time.time()
+    member = f"{now}:{uuid.uuid4().hex}"
+    
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            for key in _limits(email, client_ip):
+                pipe.zadd(key, {member: now})
+                pipe.expire(key, settings.login_attempt_window)
+            await pipe.execute()
+    except RedisError:
+        pass
+
+
+async def clear(email: str, client_ip: Optional[str]) -> None:
+    """Forget the email's failures from this IP after a successful login."""
+    if not client_ip:
+        return
+    try:
+        await get_redis().delete(f"login:email_ip:{email.lower()}:{client_ip}")
+    except RedisError:
+        pass
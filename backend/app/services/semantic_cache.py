@@ -0,0 +1,84 @@
+"""Response cache for AI completions.
+
+Entries are looked up in two tiers: an exact key over the full request,
+then a normalized key that ignores whitespace differences so
+near-duplicate prompts resolve to the same stored response. Case is kept,
+since prompts that differ only in case can ask for different output.
+"""
+
+import hashlib
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from redis.exceptions import RedisError
+
+from app.core.cache import get_redis
+from app.core.config import get_settings
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize(content: str) -> str:
+    """Collapse whitespace in message content."""
+    return _WHITESPACE_RE.sub(" ", content).strip()
+
+
+def _digest(payload: Any) -> str:
+    """Hash a JSON-serializable payload into a stable key."""
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _keys(
+    messages: List[Dict[str, str]], meta: Dict[str, Any], semantic: bool
+) -> Tuple[str, ...]:
+    """Build the cache keys for a request, most specific first."""
+    namespace = f"ai_cache:{meta.get('namespace', 'global')}"
+    keys = [f"{namespace}:exact:{_digest([meta, messages])}"]
+    if semantic:
+        normalized = [
+            {"role": message["role"], "content": _normalize(message["content"])}
+            for message in messages
+        ]
+        keys.append(f"{namespace}:norm:{_digest([meta, normalized])}")
+    return tuple(keys)
+
+
+async def get(
+    messages: List[Dict[str, str]],
+    meta: Dict[str, Any],
+    semantic: bool = True,
+) -> Optional[str]:
+    """Get a cached response for the given messages, if any."""
+    if not get_settings().ai_cache_enabled:
+        return None
+
+    try:
+        values = await get_redis().mget(_keys(messages, meta, semantic))
+    except RedisError:
+        return None
+
+    for value in values:
+        if value is not None:
+            return value.decode("utf-8")
+    return None
+
+
+async def put(
+    messages: List[Dict[str, str]],
+    meta: Dict[str, Any],
+    response: str,
+    semantic: bool = True,
+) -> None:
+    """Store a response for the given messages."""
+    settings = get_settings()
+    if not settings.ai_cache_enabled:
+        return
+
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for key in _keys(messages, meta, semantic):
+                pipe.set(key, response, ex=settings.ai_cache_ttl)
+            await pipe.execute()
+    except RedisError:
+        pass
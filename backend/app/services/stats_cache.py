@@ -0,0 +1,81 @@
+"""Per-user document statistics kept as Redis counters.
+
+Each user's counts live in a hash at ``stats:{user_id}``. The hash is
+filled from SQL on a miss; after that, writes whose effect on the counts
+is known apply increments instead of dropping it, so /stats keeps being
+served from Redis. Writes that cannot tell their delta invalidate the hash.
+The TTL bounds how long any drift can survive.
+"""
+
+from typing import Dict, Optional
+
+from redis.exceptions import RedisError
+
+from app.core.cache import get_redis
+from app.core.config import get_settings
+
+COUNTERS = ("total_documents", "published_documents", "total_words", "total_ai_sessions")
+
+# Only adjust counters that are already populated; incrementing a missing
+# hash would start it from zero and report partial totals
+_INCREMENT_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 1, #ARGV, 2 do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+
+def _key(user_id: int) -> str:
+    return f"stats:{user_id}"
+
+
+async def get(user_id: int) -> Optional[Dict[str, int]]:
+    """Get a user's cached counters, if populated."""
+    try:
+        values = await get_redis().hgetall(_key(user_id))
+    except RedisError:
+        return None
+    if len(values) < len(COUNTERS):
+        return None
+    return {name: int(values[name.encode()]) for name in COUNTERS}
+
+
+async def put(user_id: int, counts: Dict[str, int]) -> None:
+    """Populate a user's counters from freshly computed totals."""
+    key = _key(user_id)
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={name: counts[name] for name in COUNTERS})
+            pipe.expire(key, get_settings().stats_cache_ttl)
+            await pipe.execute()
+    except RedisError:
+        pass
+
+
+async def increment(user_id: int, **deltas: int) -> None:
+    """Apply counter deltas for a write, if the user's counters are populated."""
+    args = []
+    for name, delta in deltas.items():
+        if delta:
+            args += [name, delta]
+    if not args:
+        return
+
+    try:
+        script = get_redis().register_script(_INCREMENT_IF_EXISTS)
+        await script(keys=[_key(user_id)], args=args)
+    except RedisError:
+        # The counters may now be off, so stop serving them
+        await invalidate(user_id)
+
+
+async def invalidate(user_id: int) -> None:
+    """Drop a user's counters after a write with an unknown effect on them."""
+    try:
+        await get_redis().delete(_key(user_id))
+    except RedisError:
+        pass
@@ -0,0 +1,44 @@
+"""Word counting helpers for document content."""
+
+from typing import Optional, Union
+
+# Long texts are split in windows of this many characters, which keeps the
+# temporary token list small and is faster than one str.split() over the
+# whole text.
+WORD_COUNT_WINDOW = 64 * 1024
+
+
+class WordCounter:
+    """Count whitespace-separated words across consecutive text chunks.
+
+    Chunks may be ``str`` or raw ``bytes``. Bytes are split on ASCII
+    whitespace without decoding, so UTF-8 input can be counted straight
+    off the wire even when a multi-byte character spans two chunks.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._ended_in_space = True
+
+    def feed(self, text: Union[str, bytes]) -> None:
+        """Add the words in the next chunk of text."""
+        if not text:
+            return
+        self.count += len(text.split())
+        # A word spanning the chunk boundary was counted in both chunks
+        if not self._ended_in_space and not text[:1].isspace():
+            self.count -= 1
+        self._ended_in_space = text[-1:].isspace()
+
+
+def word_count(text: Optional[str]) -> int:
+    """Count whitespace-separated words in text."""
+    if not text:
+        return 0
+    if len(text) <= WORD_COUNT_WINDOW:
+        return len(text.split())
+
+    counter = WordCounter()
+    for start in range(0, len(text), WORD_COUNT_WINDOW):
+        counter.feed(text[start:start + WORD_COUNT_WINDOW])
+    return counter.count
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Create missing tables and bring existing ones up to the current models.
+
+Run from the backend directory:
+
+    python scripts/migrate.py
+
+``create_all`` only creates tables that do not exist yet, so on databases
+created before a model changed, new columns and indexes are missing and
+retyped columns keep their old type. Each step here inspects the live
+schema or data first, which makes the script safe to re-run.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+from sqlalchemy import JSON, Integer, String, case, cast, column, inspect, table, text
+from sqlalchemy import Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Connection
+
+# Add the app directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.database import Base, close_db, get_engine, init_db
+from app.models import OrdinalEnum
+
+
+def add_missing_columns(conn: Connection) -> None:
+    """Add nullable model columns that existing tables lack.
+
+    For example ``users.deleted_at`` on SQLite becomes:
+
+        ALTER TABLE users ADD COLUMN deleted_at DATETIME
+    """
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+
+    for model_table in Base.metadata.sorted_tables:
+        existing = {col["name"] for col in inspector.get_columns(model_table.name)}
+        for model_column in model_table.columns:
+            if model_column.name in existing:
+                continue
+            if not model_column.nullable:
+                raise RuntimeError(
+                    f"{model_table.name}.{model_column.name} is NOT NULL and must be added by hand"
+                )
+
+            column_type = model_column.type.compile(dialect=conn.dialect)
+            conn.execute(text(
+                f"ALTER TABLE {quote(model_table.name)} ADD COLUMN {quote(model_column.name)} {column_type}"
+            ))
+            print(f"Added {model_table.name}.{model_column.name}")
+
+
+def convert_enum_columns(conn: Connection) -> None:
+    """Store enum columns written as strings as their SMALLINT positions.
+
+    Older databases hold the Enum member name (``'DRAFT'``) in a string
+    column, or in a native ENUM type on PostgreSQL. PostgreSQL columns are
+    retyped, e.g. for ``documents.status``:
+
+        ALTER TABLE documents ALTER COLUMN status TYPE SMALLINT
+            USING CASE CAST(status AS VARCHAR) WHEN 'DRAFT' THEN 0 ... END
+
+    and the unused ENUM types dropped. SQLite cannot retype a column, so
+    its values are rewritten in place and read back through the column's
+    type affinity.
+    """
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    enum_types = set()
+
+    for model_table in Base.metadata.sorted_tables:
+        live_types = {col["name"]: col["type"] for col in inspector.get_columns(model_table.name)}
+        for model_column in model_table.columns:
+            live_type = live_types[model_column.name]
+            if not isinstance(model_column.type, OrdinalEnum) or isinstance(live_type, Integer):
+                continue
+
+            positions = {}
+            for position, member in enumerate(model_column.type.enum_class):
+                positions[member.name] = position
+                positions[str(member.value)] = position
+            old = column(model_column.name)
+
+            if conn.dialect.name == "postgresql":
+                using = case(positions, value=cast(old, String)).compile(
+                    dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+                )
+                conn.execute(text(
+                    f"ALTER TABLE {quote(model_table.name)} ALTER COLUMN "
+                    f"{quote(model_column.name)} TYPE SMALLINT USING {using}"
+                ))
+                if isinstance(live_type, SQLEnum) and live_type.name:
+                    enum_types.add(live_type.name)
+                print(f"Converted {model_table.name}.{model_column.name}")
+            else:
+                result = conn.execute(
+                    table(model_table.name, old)
+                    .update()
+                    .where(old.in_(list(positions)))
+                    .values({model_column.name: case(positions, value=old)})
+                )
+                if result.rowcount:
+                    print(f"Converted {result.rowcount} rows of {model_table.name}.{model_column.name}")
+
+    for name in enum_types:
+        conn.execute(text(f"DROP TYPE IF EXISTS {quote(name)}"))
+
+
+def convert_json_columns(conn: Connection) -> None:
+    """Retype PostgreSQL ``json`` columns that the models declare as JSONB.
+
+    For example ``ai_sessions.messages`` becomes:
+
+        ALTER TABLE ai_sessions ALTER COLUMN messages TYPE JSONB USING messages::jsonb
+
+    Other databases keep plain JSON, so there is nothing to convert.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+
+    for model_table in Base.metadata.sorted_tables:
+        live_types = {col["name"]: col["type"] for col in inspector.get_columns(model_table.name)}
+        for model_column in model_table.columns:
+            live_type = live_types[model_column.name]
+            if not isinstance(model_column.type.dialect_impl(conn.dialect), JSONB):
+                continue
+            if not isinstance(live_type, JSON) or isinstance(live_type, JSONB):
+                continue
+
+            name = quote(model_column.name)
+            conn.execute(text(
+                f"ALTER TABLE {quote(model_table.name)} ALTER COLUMN {name} "
+                f"TYPE JSONB USING {name}::jsonb"
+            ))
+            print(f"Converted {model_table.name}.{model_column.name} to JSONB")
+
+
+def create_missing_indexes(conn: Connection) -> None:
+    """Create model indexes that existing tables lack.
+
+    Indexes limited to a dialect with ``ddl_if`` are skipped elsewhere.
+    On PostgreSQL the pg_trgm extension behind the trigram search indexes
+    is enabled first.
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    inspector = inspect(conn)
+
+    for model_table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(model_table.name)}
+        for index in sorted(model_table.indexes, key=lambda index: index.name):
+            if index.name in existing:
+                continue
+            index.create(conn, checkfirst=True)
+            if inspect(conn).has_index(model_table.name, index.name):
+                print(f"Created {index.name}")
+
+
+async def migrate() -> None:
+    """Create missing tables, then upgrade the existing ones."""
+    await init_db()
+    async with get_engine().begin() as conn:
+        await conn.run_sync(add_missing_columns)
+        await conn.run_sync(convert_enum_columns)
+        await conn.run_sync(convert_json_columns)
+        await conn.run_sync(create_missing_indexes)
+    await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,119 @@
+"""Tests for the document listing's keyset pagination."""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+# Add the app directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.api.routes.auth import get_current_user
+from app.api.routes.documents import EAGER_PAGE_LIMIT
+from app.core.database import Base, get_db
+from app.main import app
+from app.models import Document, User
+
+DOCUMENTS_URL = "/api/v1/documents/"
+BASE_TIME = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Client for a user owning 12 documents, 5 of which share updated_at."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    owner = {"id": 1, "email": "a@b.com", "username": "a", "hashed_password": "x"}
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(User).values(**owner))
+            # ids 1-7 have distinct past timestamps
+            await conn.execute(insert(Document), [
+                {
+                    "id": id_,
+                    "title": f"Document {id_}",
+                    "owner_id": 1,
+                    "tags": [],
+                    "updated_at": BASE_TIME + timedelta(minutes=id_),
+                }
+                for id_ in range(1, 8)
+            ])
+            # ids 8-12 share the database clock's value, which is how edits
+            # stamp updated_at, in one statement
+            await conn.execute(insert(Document).values([
+                {
+                    "id": id_,
+                    "title": f"Document {id_}",
+                    "owner_id": 1,
+                    "tags": [],
+                    "updated_at": func.now(),
+                }
+                for id_ in range(8, 13)
+            ]))
+
+    async def get_test_db():
+        async with AsyncSession(engine) as session:
+            yield session
+
+    asyncio.run(setup())
+    app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[get_current_user] = lambda: User(**owner)
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    asyncio.run(engine.dispose())
+
+
+def _ids(page):
+    return [document["id"] for document in page]
+
+
+def test_cursor_pages_through_tied_timestamps(client):
+    """Every document is returned once, in order, across pages that split ties."""
+    seen = []
+    params = {"limit": 3}
+    # Four full pages and an empty one; a cursor that repeats rows never ends
+    for _ in range(5):
+        page = client.get(DOCUMENTS_URL, params=params).json()
+        if not page:
+            break
+        seen += _ids(page)
+        params = {"limit": 3, "cursor": page[-1]["updated_at"], "cursor_id": page[-1]["id"]}
+
+    assert seen == list(range(12, 0, -1))
+
+
+def test_cursor_without_cursor_id_skips_to_older_timestamps(client):
+    """A bare cursor returns only documents strictly older than it."""
+    first = client.get(DOCUMENTS_URL, params={"limit": 2}).json()
+    assert _ids(first) == [12, 11]
+
+    page = client.get(DOCUMENTS_URL, params={"limit": 3, "cursor": first[-1]["updated_at"]}).json()
+    assert _ids(page) == [7, 6, 5]
+
+
+def test_streamed_and_eager_pages_match(client):
+    """Pages above EAGER_PAGE_LIMIT are streamed with the same JSON body."""
+    eager = client.get(DOCUMENTS_URL, params={"limit": EAGER_PAGE_LIMIT})
+    streamed = client.get(DOCUMENTS_URL, params={"limit": EAGER_PAGE_LIMIT + 1})
+
+    assert eager.status_code == streamed.status_code == 200
+    assert "content-length" not in streamed.headers
+    assert streamed.json() == eager.json()
+    assert streamed.content == eager.content
+    assert len(eager.json()) == 12
+
+
+def test_streamed_page_continues_from_cursor(client):
+    """The streamed branch applies the same cursor filter."""
+    first = client.get(DOCUMENTS_URL, params={"limit": 3}).json()
+    params = {"cursor": first[-1]["updated_at"], "cursor_id": first[-1]["id"]}
+    eager = client.get(DOCUMENTS_URL, params={**params, "limit": EAGER_PAGE_LIMIT}).json()
+    streamed = client.get(DOCUMENTS_URL, params={**params, "limit": EAGER_PAGE_LIMIT + 1}).json()
+
+    assert _ids(streamed) == _ids(eager) == [9, 8, 7, 6, 5, 4, 3, 2, 1]
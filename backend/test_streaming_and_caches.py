@@ -0,0 +1,217 @@
+"""Tests for AI stream coalescing, word counting and the caches."""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+# Add the app directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core import auth_cache
+from app.core.auth_cache import TTLCache
+from app.core.database import Base
+from app.core.security import create_access_token
+from app.models import User
+from app.services import stats_cache
+from app.services.ai_service import _STREAM_END, _coalesce_chunks, _pump_stream
+from app.services.text_stats import WordCounter
+
+
+async def _collect(queue: asyncio.Queue, max_bytes: int = 1024, max_delay: float = 1.0):
+    chunks = []
+    async for chunk in _coalesce_chunks(queue, max_bytes, max_delay):
+        chunks.append(chunk)
+    return chunks
+
+
+def _queue_of(*items) -> asyncio.Queue:
+    queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+    return queue
+
+
+@pytest.mark.asyncio
+async def test_coalesce_joins_until_max_bytes():
+    """A batch is flushed as soon as it reaches max_bytes."""
+    queue = _queue_of("ab", "cd", "ef", _STREAM_END)
+    assert await _collect(queue, max_bytes=4) == ["abcd", "ef"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flushes_after_max_delay():
+    """Chunks arriving after the deadline start a new batch."""
+    queue = asyncio.Queue()
+
+    async def produce():
+        await queue.put("a")
+        await asyncio.sleep(0.2)
+        await queue.put("b")
+        await queue.put(_STREAM_END)
+
+    producer = asyncio.create_task(produce())
+    assert await _collect(queue, max_delay=0.05) == ["a", "b"]
+    await producer
+
+
+@pytest.mark.asyncio
+async def test_coalesce_sends_partial_batch_before_error():
+    """An error partway through a batch is raised after the chunks before it."""
+    queue = _queue_of("ab", "cd", ValueError("provider failed"), "never sent")
+    received = []
+    with pytest.raises(ValueError, match="provider failed"):
+        async for chunk in _coalesce_chunks(queue, 1024, 1.0):
+            received.append(chunk)
+    assert received == ["abcd"]
+
+
+@pytest.mark.asyncio
+async def test_pump_stream_queues_error_and_closes_source():
+    """A failing provider stream is closed and its error queued in order."""
+    closed = []
+
+    async def source():
+        try:
+            yield "a"
+            yield "b"
+            raise ValueError("provider failed")
+        finally:
+            closed.append(True)
+
+    queue = asyncio.Queue()
+    await _pump_stream(source(), queue)
+    items = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert items[:2] == ["a", "b"]
+    assert isinstance(items[2], ValueError) and len(items) == 3
+    assert closed == [True]
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "one",
+    "two words",
+    "  leading and trailing  ",
+    "tabs\tand\nnew lines\r\n",
+    "héllo wörld ünïcode",
+])
+def test_word_counter_across_chunk_boundaries(text):
+    """Splitting the text anywhere gives the same count as str.split()."""
+    for data in (text, text.encode()):
+        expected = len(data.split())
+        for first in range(len(data) + 1):
+            for second in range(first, len(data) + 1):
+                counter = WordCounter()
+                counter.feed(data[:first])
+                counter.feed(data[first:second])
+                counter.feed(data[second:])
+                assert counter.count == expected, (data, first, second)
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    """Entries expire after the TTL, or a shorter per-entry TTL."""
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=30)
+    cache.set("user", 1)
+    cache.set("token", 2, ttl=5)
+
+    now[0] += 5
+    assert cache.get("user") == 1
+    assert cache.get("token") is None
+
+    now[0] += 25
+    assert cache.get("user") is None
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    """A full cache drops the entry read or written least recently."""
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+@pytest.mark.asyncio
+async def test_stats_increment_only_updates_populated_counters(monkeypatch):
+    """Increments are dropped for a user whose stats hash does not exist."""
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(stats_cache, "get_redis", lambda: redis)
+
+    await stats_cache.increment(1, total_documents=1, total_words=10)
+    assert not await redis.exists("stats:1")
+
+    counts = dict.fromkeys(stats_cache.COUNTERS, 0)
+    await stats_cache.put(1, counts)
+    await stats_cache.increment(1, total_documents=1, total_words=10)
+    assert await stats_cache.get(1) == {**counts, "total_documents": 1, "total_words": 10}
+
+
+def _forget_local_auth_state():
+    """Drop per-process auth state, as a different worker would have."""
+    for cache in (auth_cache._token_subjects, auth_cache._users, auth_cache._revoked_tokens):
+        cache.clear()
+
+
+@pytest.fixture
+def shared_redis(monkeypatch):
+    """Fake Redis shared by auth_cache, with its per-process caches cleared."""
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(auth_cache, "get_redis", lambda: redis)
+    _forget_local_auth_state()
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_revoked_token_is_rejected_by_other_processes(shared_redis):
+    """A revocation is kept in Redis until the token would have expired."""
+    token = create_access_token(subject=1)
+    await auth_cache.revoke_token(token)
+    ttl = await shared_redis.ttl(auth_cache._revoked_key(token))
+    assert 0 < ttl <= auth_cache.MAX_TOKEN_LIFETIME + 1
+
+    _forget_local_auth_state()
+    assert auth_cache.get_token_subject(token) == "1"
+    assert await auth_cache.is_revoked(token)
+
+
+@pytest.mark.asyncio
+async def test_invalidated_user_is_reloaded_by_other_processes(shared_redis):
+    """A cached user is loaded again once another process invalidates it."""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    token = create_access_token(subject=1)
+
+    async with AsyncSession(engine) as db:
+        db.add(User(id=1, email="a@b.com", username="a", hashed_password="x"))
+        await db.commit()
+    async with AsyncSession(engine) as db:
+        assert (await auth_cache.get_user(db, 1, token)).is_active
+
+    async with AsyncSession(engine) as db:
+        await db.execute(update(User).where(User.id == 1).values(is_active=False))
+        await db.commit()
+    async with AsyncSession(engine) as db:
+        # Still served from this process's cache
+        assert (await auth_cache.get_user(db, 1, token)).is_active
+
+    # Another worker invalidates the user; its local cache is not this one
+    await shared_redis.set(auth_cache._user_key(1), "changed")
+    async with AsyncSession(engine) as db:
+        assert not (await auth_cache.get_user(db, 1, token)).is_active
+
+    await auth_cache.revoke_token(token)
+    _forget_local_auth_state()
+    async with AsyncSession(engine) as db:
+        assert await auth_cache.get_user(db, 1, token) is None
+    await engine.dispose()